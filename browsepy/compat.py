@@ -4,6 +4,7 @@
 import os
 import os.path
 import sys
+import random
 import itertools
 
 import warnings
@@ -27,6 +28,60 @@ try:
 except ImportError:
     from backports.shutil_get_terminal_size import get_terminal_size  # noqa
 
+try:
+    from functools import lru_cache  # python >= 3.2
+except ImportError:
+    def lru_cache(maxsize=128):
+        '''
+        Get a memoizing function decorator, ignoring the given size limit
+        and keeping caches unbounded.
+
+        Fallback for :func:`functools.lru_cache`, available since
+        Python 3.2.
+
+        :param maxsize: ignored, caches are unbounded
+        :type maxsize: int or None
+        :return: memoizing decorator
+        :rtype: callable
+        '''
+        def decorator(fnc):
+            cache = {}
+
+            @functools.wraps(fnc)
+            def wrapper(*args):
+                try:
+                    return cache[args]
+                except KeyError:
+                    result = cache[args] = fnc(*args)
+                    return result
+            wrapper.cache_clear = cache.clear
+            return wrapper
+        return decorator
+
+try:
+    from functools import cached_property  # python >= 3.8
+except ImportError:
+    from werkzeug.utils import cached_property  # noqa
+
+try:
+    from random import choices  # python >= 3.6
+except ImportError:
+    def choices(population, k=1):
+        '''
+        Get k randomly chosen elements from given population, with
+        replacement.
+
+        Fallback for :func:`random.choices`, available since Python 3.6.
+
+        :param population: sequence to choose from
+        :type population: collections.abc.Sequence
+        :param k: number of elements to choose, defaults to 1
+        :type k: int
+        :return: chosen elements
+        :rtype: list
+        '''
+        return [random.choice(population) for _ in range(k)]
+
 
 def isexec(path):
     '''
@@ -82,6 +137,27 @@ def fsencode(path, os_name=os.name, fs_encoding=FS_ENCODING, errors=None):
     return path.encode(fs_encoding, errors=errors)
 
 
+def isascii(text):
+    '''
+    Check if given unicode string only contains ASCII characters.
+
+    Uses :meth:`str.isascii` where available (Python 3.7 and above).
+
+    :param text: unicode string to check
+    :type text: str
+    :return: True if ASCII-only, False otherwise
+    :rtype: bool
+    '''
+    try:
+        return text.isascii()
+    except AttributeError:
+        try:
+            text.encode('ascii')
+        except UnicodeEncodeError:
+            return False
+        return True
+
+
 def getcwd(fs_encoding=FS_ENCODING, cwd_fnc=os.getcwd):
     '''
     Get current work directory's absolute path.
@@ -3,19 +3,18 @@
 
 import os
 import os.path
-import re
+import stat
+import math
 import shutil
 import codecs
 import string
-import random
 import datetime
 import logging
 
 from flask import current_app, send_from_directory
-from werkzeug.utils import cached_property
 
 from . import compat
-from .compat import range
+from .compat import range, cached_property, choices, lru_cache
 from .stream import TarFileStream
 from .exceptions import OutsideDirectoryBase, OutsideRemovableBase, \
                         PathTooLongError, FilenameTooLongError
@@ -32,13 +31,15 @@ standard_units = ("B", "KB", "MB", "GB", "TB", "PB", "EB", "ZB", "YB")
 common_path_separators = '\\/'
 restricted_chars = '/\0'
 nt_restricted_chars = '/\0\\<>:"|?*' + ''.join(map(chr, range(1, 32)))
-restricted_names = ('.', '..', '::', '/', '\\')
-nt_device_names = (
+restricted_names = frozenset(('.', '..', '::', '/', '\\'))
+nt_device_names = frozenset(
     ('CON', 'PRN', 'AUX', 'NUL') +
     tuple(map('COM{}'.format, range(1, 10))) +
     tuple(map('LPT{}'.format, range(1, 10)))
     )
 fs_safe_characters = string.ascii_uppercase + string.digits
+binary_units_log = math.log(1024.)
+standard_units_log = math.log(1000.)
 
 
 class Node(object):
@@ -60,10 +61,20 @@ class Node(object):
     directory_class = None  # set later at import time
     file_class = None  # set later at import time
 
-    re_charset = re.compile('; charset=(?P<charset>[^;]+)')
     can_download = False
     is_root = False
 
+    @cached_property
+    def _directory_base(self):
+        '''
+        Get current app config's directory_base, cached per node so
+        repeated path logic skips the config dict lookup.
+
+        :returns: directory base path
+        :rtype: str
+        '''
+        return self.app.config['directory_base']
+
     @cached_property
     def is_excluded(self):
         '''
@@ -107,6 +118,17 @@ class Node(object):
                 )
         return widgets + self.plugin_manager.get_widgets(file=self)
 
+    @cached_property
+    def _widgets_by_place(self):
+        '''
+        Get mapping of widget place to last widget on it, based on
+        :attr:`widgets`.
+
+        :returns: mapping of place to widget
+        :rtype: dict of namedtuple instances
+        '''
+        return {widget.place: widget for widget in self.widgets}
+
     @cached_property
     def link(self):
         '''
@@ -115,11 +137,7 @@ class Node(object):
         :returns: widget on entry-link (ideally a link one)
         :rtype: namedtuple instance
         '''
-        link = None
-        for widget in self.widgets:
-            if widget.place == 'entry-link':
-                link = widget
-        return link
+        return self._widgets_by_place.get('entry-link')
 
     @cached_property
     def can_remove(self):
@@ -133,15 +151,42 @@ class Node(object):
         dirbase = self.app.config["directory_remove"]
         return bool(dirbase and check_under_base(self.path, dirbase))
 
+    @cached_property
+    def _lstat(self):
+        '''
+        Get stats object for node's path itself (without following
+        symlinks), as returned by os.lstat function.
+
+        :returns: stats object
+        :rtype: posix.stat_result or nt.stat_result
+        '''
+        return os.lstat(self.path)
+
+    @cached_property
+    def is_symlink(self):
+        '''
+        Get if node path is a symbolic link.
+
+        :returns: True if symlink, False otherwise
+        :rtype: bool
+        '''
+        try:
+            return stat.S_ISLNK(self._lstat.st_mode)
+        except OSError:
+            return False
+
     @cached_property
     def stats(self):
         '''
-        Get current stats object as returned by os.stat function.
+        Get current stats object as returned by os.stat function,
+        following symlinks.
 
         :returns: stats object
         :rtype: posix.stat_result or nt.stat_result
         '''
-        return os.stat(self.path)
+        if stat.S_ISLNK(self._lstat.st_mode):
+            return os.stat(self.path)
+        return self._lstat
 
     @cached_property
     def pathconf(self):
@@ -162,7 +207,7 @@ class Node(object):
         :returns: parent object if available
         :rtype: Node instance or None
         '''
-        if check_path(self.path, self.app.config['directory_base']):
+        if check_path(self.path, self._directory_base):
             return None
         parent = os.path.dirname(self.path) if self.path else None
         return self.directory_class(parent, self.app) if parent else None
@@ -175,12 +220,19 @@ class Node(object):
         :returns: list of ancestors starting from nearest.
         :rtype: list of Node objects
         '''
-        ancestors = []
-        parent = self.parent
-        while parent:
-            ancestors.append(parent)
-            parent = parent.parent
-        return ancestors
+        base = self._directory_base
+        path = self.path
+        paths = []
+        while path and not check_path(path, base):
+            parent = os.path.dirname(path)
+            if parent == path:
+                break
+            paths.append(parent)
+            path = parent
+        return [
+            self.directory_class(path=path, app=self.app)
+            for path in paths
+            ]
 
     @property
     def modified(self):
@@ -205,7 +257,7 @@ class Node(object):
         :returns: relative-url-like for node's path
         :rtype: str
         '''
-        return abspath_to_urlpath(self.path, self.app.config['directory_base'])
+        return abspath_to_urlpath(self.path, self._directory_base)
 
     @property
     def name(self):
@@ -288,12 +340,24 @@ class Node(object):
         base = app.config['directory_base']
         path = urlpath_to_abspath(path, base)
         if not cls.generic:
-            kls = cls
-        elif os.path.isdir(path):
-            kls = cls.directory_class
+            return cls(path=path, app=app)
+        try:
+            stats = os.lstat(path)
+        except OSError:
+            return cls.file_class(path=path, app=app)
+        if stat.S_ISLNK(stats.st_mode):
+            kls = (
+                cls.directory_class
+                if os.path.isdir(path) else
+                cls.file_class
+                )
         else:
-            kls = cls.file_class
-        return kls(path=path, app=app)
+            kls = (
+                cls.directory_class
+                if stat.S_ISDIR(stats.st_mode) else
+                cls.file_class
+                )
+        return kls(path=path, app=app, _lstat=stats)
 
     @classmethod
     def register_file_class(cls, kls):
@@ -393,7 +457,10 @@ class File(Node):
         :returns: True if file, False otherwise
         :rtype: bool
         '''
-        return os.path.isfile(self.path)
+        try:
+            return stat.S_ISREG(self.stats.st_mode)
+        except OSError:
+            return False
 
     @property
     def size(self):
@@ -423,11 +490,10 @@ class File(Node):
         :returns: file conding as returned by mimetype function or "default"
         :rtype: str
         '''
-        if ";" in self.mimetype:
-            match = self.re_charset.search(self.mimetype)
-            gdict = match.groupdict() if match else {}
-            return gdict.get("charset") or "default"
-        return "default"
+        charset = self.mimetype.partition('; charset=')[2]
+        if charset:
+            return charset.partition(';')[0].strip() or 'default'
+        return 'default'
 
     def remove(self):
         '''
@@ -545,7 +611,10 @@ class Directory(Node):
         :returns: True if real directory, False otherwise
         :rtype: bool
         '''
-        return os.path.isdir(self.path)
+        try:
+            return stat.S_ISDIR(self.stats.st_mode)
+        except OSError:
+            return False
 
     @cached_property
     def is_root(self):
@@ -601,7 +670,7 @@ class Directory(Node):
         '''
         if self._listdir_cache is not None:
             return not bool(self._listdir_cache)
-        for entry in self._listdir():
+        for entry in scandir(self.path, self.app):
             return False
         return True
 
@@ -656,15 +725,19 @@ class Directory(Node):
         :raises FilenameTooLong: when filesystem filename size limit is reached
         :raises PathTooLong: when OS or filesystem path size limit is reached
         '''
+        existing = {entry.name for entry in compat.scandir(self.path)}
         new_filename = filename
         for attempt in range(2, attempts + 1):
-            if not self.contains(new_filename):
+            if new_filename not in existing:
                 break
             new_filename = alternative_filename(filename, attempt)
         else:
-            while self.contains(new_filename):
+            while new_filename in existing:
                 new_filename = alternative_filename(filename)
 
+        while self.contains(new_filename):  # guard against races
+            new_filename = alternative_filename(filename)
+
         limit = self.pathconf.get('PC_NAME_MAX', 0)
         if limit and limit < len(filename):
             raise FilenameTooLongError(
@@ -677,10 +750,14 @@ class Directory(Node):
 
         return new_filename
 
-    def _listdir(self, precomputed_stats=(os.name == 'nt')):
+    def _listdir(self, precomputed_stats=True):
         '''
         Iter unsorted entries on this directory.
 
+        Stats are taken from scandir entries themselves (one syscall at
+        most per entry), and forwarded to yielded nodes.
+
+        :param precomputed_stats: ignored, kept for backwards compatibility
         :yields: Directory or File instance for each entry in directory
         :ytype: Node
         '''
@@ -692,14 +769,21 @@ class Directory(Node):
                 'is_excluded': False
                 }
             try:
-                if precomputed_stats and not entry.is_symlink():
-                    kwargs['stats'] = entry.stat()
-                if entry.is_dir(follow_symlinks=True):
-                    yield self.directory_class(**kwargs)
-                else:
-                    yield self.file_class(**kwargs)
-            except OSError as e:
-                logger.exception(e)
+                entry_stats = entry.stat(follow_symlinks=entry.is_symlink())
+            except OSError:
+                # stating the target failed (most likely a broken symlink),
+                # still list the entry as a file with its own lstat
+                try:
+                    kwargs['_lstat'] = entry.stat(follow_symlinks=False)
+                except OSError:
+                    pass
+                yield self.file_class(**kwargs)
+                continue
+            kwargs['stats'] = entry_stats
+            if stat.S_ISDIR(entry_stats.st_mode):
+                yield self.directory_class(**kwargs)
+            else:
+                yield self.file_class(**kwargs)
 
     def listdir(self, sortkey=None, reverse=False):
         '''
@@ -732,14 +816,28 @@ def fmt_size(size, binary=True):
     if binary:
         fmt_sizes = binary_units
         fmt_divider = 1024.
+        fmt_log = binary_units_log
     else:
         fmt_sizes = standard_units
         fmt_divider = 1000.
-    for fmt in fmt_sizes[:-1]:
-        if size < 1000:
-            return (size, fmt)
+        fmt_log = standard_units_log
+    if size < 1000:
+        return (size, fmt_sizes[0])
+    # units switch at 1000 even with binary multiples, hence the
+    # size / 1000 bias; the corrections below guard against the
+    # logarithm rounding across unit boundaries
+    index = min(
+        int(math.log(size / 1000.) / fmt_log) + 1,
+        len(fmt_sizes) - 1
+        )
+    size /= fmt_divider ** index
+    if size >= 1000 and index < len(fmt_sizes) - 1:
+        index += 1
         size /= fmt_divider
-    return size, fmt_sizes[-1]
+    elif size * fmt_divider < 1000 and index:
+        index -= 1
+        size *= fmt_divider
+    return size, fmt_sizes[index]
 
 
 def relativize_path(path, base, os_sep=os.sep):
@@ -759,41 +857,94 @@ def relativize_path(path, base, os_sep=os.sep):
     if not check_base(path, base, os_sep):
         raise OutsideDirectoryBase("%r is not under %r" % (path, base))
     prefix_len = len(base)
-    if not base.endswith(os_sep):
+    if base[-1:] != os_sep:
         prefix_len += len(os_sep)
     return path[prefix_len:]
 
 
-def abspath_to_urlpath(path, base, os_sep=os.sep):
-    '''
-    Make filesystem absolute path uri relative using given absolute base path.
+if compat.PY_LEGACY:
+    def abspath_to_urlpath(path, base, os_sep=os.sep):
+        '''
+        Make filesystem absolute path uri relative using given absolute base
+        path.
 
-    :param path: absolute path
-    :param base: absolute base path
-    :param os_sep: path component separator, defaults to current OS separator
-    :return: relative uri
-    :rtype: str or unicode
-    :raises OutsideDirectoryBase: if resulting path is not below base
-    '''
-    return relativize_path(path, base, os_sep).replace(os_sep, '/')
+        :param path: absolute path
+        :param base: absolute base path
+        :param os_sep: path component separator, defaults to current OS
+                       separator
+        :return: relative uri
+        :rtype: str or unicode
+        :raises OutsideDirectoryBase: if resulting path is not below base
+        '''
+        return relativize_path(path, base, os_sep).replace(os_sep, '/')
 
+    def urlpath_to_abspath(path, base, os_sep=os.sep):
+        '''
+        Make uri relative path fs absolute using a given absolute base path.
 
-def urlpath_to_abspath(path, base, os_sep=os.sep):
-    '''
-    Make uri relative path fs absolute using a given absolute base path.
+        :param path: relative path
+        :param base: absolute base path
+        :param os_sep: path component separator, defaults to current OS
+                       separator
+        :return: absolute path
+        :rtype: str or unicode
+        :raises OutsideDirectoryBase: if resulting path is not below base
+        '''
+        prefix = base if base[-1:] == os_sep else base + os_sep
+        realpath = os.path.abspath(prefix + path.replace('/', os_sep))
+        if check_base(realpath, base):
+            return realpath
+        raise OutsideDirectoryBase("%r is not under %r" % (realpath, base))
+else:
+    @lru_cache(maxsize=None)
+    def path_sep_table(source, destination):
+        '''
+        Get (and cache) a :meth:`str.translate` table mapping source path
+        separator to destination path separator.
 
-    :param path: relative path
-    :param base: absolute base path
-    :param os_sep: path component separator, defaults to current OS separator
-    :return: absolute path
-    :rtype: str or unicode
-    :raises OutsideDirectoryBase: if resulting path is not below base
-    '''
-    prefix = base if base.endswith(os_sep) else base + os_sep
-    realpath = os.path.abspath(prefix + path.replace('/', os_sep))
-    if check_path(base, realpath) or check_under_base(realpath, base):
-        return realpath
-    raise OutsideDirectoryBase("%r is not under %r" % (realpath, base))
+        :param source: path separator to translate from
+        :type source: str
+        :param destination: path separator to translate to
+        :type destination: str
+        :return: translation table
+        :rtype: dict
+        '''
+        return str.maketrans(source, destination)
+
+    def abspath_to_urlpath(path, base, os_sep=os.sep):
+        '''
+        Make filesystem absolute path uri relative using given absolute base
+        path.
+
+        :param path: absolute path
+        :param base: absolute base path
+        :param os_sep: path component separator, defaults to current OS
+                       separator
+        :return: relative uri
+        :rtype: str or unicode
+        :raises OutsideDirectoryBase: if resulting path is not below base
+        '''
+        table = path_sep_table(os_sep, '/')
+        return relativize_path(path, base, os_sep).translate(table)
+
+    def urlpath_to_abspath(path, base, os_sep=os.sep):
+        '''
+        Make uri relative path fs absolute using a given absolute base path.
+
+        :param path: relative path
+        :param base: absolute base path
+        :param os_sep: path component separator, defaults to current OS
+                       separator
+        :return: absolute path
+        :rtype: str or unicode
+        :raises OutsideDirectoryBase: if resulting path is not below base
+        '''
+        prefix = base if base[-1:] == os_sep else base + os_sep
+        path = path.translate(path_sep_table('/', os_sep))
+        realpath = os.path.abspath(prefix + path)
+        if check_base(realpath, base):
+            return realpath
+        raise OutsideDirectoryBase("%r is not under %r" % (realpath, base))
 
 
 def generic_filename(path):
@@ -805,24 +956,49 @@ def generic_filename(path):
     :return: filename
     :rtype: str or unicode (depending on given path)
     '''
+    index = max(path.rfind(sep) for sep in common_path_separators)
+    return path[index + 1:] if index > -1 else path
 
-    for sep in common_path_separators:
-        if sep in path:
-            _, path = path.rsplit(sep, 1)
-    return path
 
+if compat.PY_LEGACY:
+    def clean_restricted_chars(path, restricted_chars=restricted_chars):
+        '''
+        Get path without restricted characters.
 
-def clean_restricted_chars(path, restricted_chars=restricted_chars):
-    '''
-    Get path without restricted characters.
+        :param path: path
+        :return: path without restricted characters
+        :rtype: str or unicode (depending on given path)
+        '''
+        for character in restricted_chars:
+            path = path.replace(character, '_')
+        return path
+else:
+    @lru_cache(maxsize=None)
+    def restricted_chars_table(restricted_chars):
+        '''
+        Get (and cache) a :meth:`str.translate` table replacing every given
+        restricted character with an underscore.
 
-    :param path: path
-    :return: path without restricted characters
-    :rtype: str or unicode (depending on given path)
-    '''
-    for character in restricted_chars:
-        path = path.replace(character, '_')
-    return path
+        :param restricted_chars: restricted character string
+        :type restricted_chars: str
+        :return: translation table
+        :rtype: dict
+        '''
+        return str.maketrans(restricted_chars, '_' * len(restricted_chars))
+
+    # prebuild tables for both known charsets, so no request pays for them
+    restricted_chars_table(restricted_chars)
+    restricted_chars_table(nt_restricted_chars)
+
+    def clean_restricted_chars(path, restricted_chars=restricted_chars):
+        '''
+        Get path without restricted characters.
+
+        :param path: path
+        :return: path without restricted characters
+        :rtype: str or unicode (depending on given path)
+        '''
+        return path.translate(restricted_chars_table(restricted_chars))
 
 
 def check_forbidden_filename(filename,
@@ -844,21 +1020,60 @@ def check_forbidden_filename(filename,
       )
 
 
-def check_path(path, base, os_sep=os.sep):
+@lru_cache(maxsize=256)
+def base_prefix(base, os_sep=os.sep):
     '''
-    Check if both given paths are equal.
+    Get (and cache) normalized base path with trailing separator,
+    suitable for prefix comparisons against normalized paths.
+
+    The base is effectively constant per request while path-containment
+    checks run once per entry, hence the cache.
 
-    :param path: absolute path
-    :type path: str
     :param base: absolute base path
     :type base: str
     :param os_sep: path separator, defaults to os.sep
-    :type base: str
-    :return: wether two path are equal or not
-    :rtype: bool
+    :type os_sep: str
+    :return: normalized base path ending with separator
+    :rtype: str
     '''
-    base = base[:-len(os_sep)] if base.endswith(os_sep) else base
-    return os.path.normcase(path) == os.path.normcase(base)
+    return os.path.normcase(base if base[-1:] == os_sep else base + os_sep)
+
+
+if os.path.normcase('Aa') == 'Aa':
+    def check_path(path, base, os_sep=os.sep):
+        '''
+        Check if both given paths are equal.
+
+        Fast variant for platforms where :func:`os.path.normcase` is an
+        identity function (so paths can be compared directly).
+
+        :param path: absolute path
+        :type path: str
+        :param base: absolute base path
+        :type base: str
+        :param os_sep: path separator, defaults to os.sep
+        :type base: str
+        :return: wether two path are equal or not
+        :rtype: bool
+        '''
+        base = base[:-len(os_sep)] if base[-1:] == os_sep else base
+        return path == base
+else:
+    def check_path(path, base, os_sep=os.sep):
+        '''
+        Check if both given paths are equal.
+
+        :param path: absolute path
+        :type path: str
+        :param base: absolute base path
+        :type base: str
+        :param os_sep: path separator, defaults to os.sep
+        :type base: str
+        :return: wether two path are equal or not
+        :rtype: bool
+        '''
+        base = base[:-len(os_sep)] if base[-1:] == os_sep else base
+        return os.path.normcase(path) == os.path.normcase(base)
 
 
 def check_base(path, base, os_sep=os.sep):
@@ -873,10 +1088,9 @@ def check_base(path, base, os_sep=os.sep):
     :return: wether path is under given base or not
     :rtype: bool
     '''
-    return (
-        check_path(path, base, os_sep) or
-        check_under_base(path, base, os_sep)
-        )
+    path = os.path.normcase(path)
+    prefix = base_prefix(base, os_sep)
+    return path == prefix[:-len(os_sep)] or path.startswith(prefix)
 
 
 def check_under_base(path, base, os_sep=os.sep):
@@ -891,8 +1105,7 @@ def check_under_base(path, base, os_sep=os.sep):
     :return: wether file is under given base or not
     :rtype: bool
     '''
-    prefix = base if base.endswith(os_sep) else base + os_sep
-    return os.path.normcase(path).startswith(os.path.normcase(prefix))
+    return os.path.normcase(path).startswith(base_prefix(base, os_sep))
 
 
 def secure_filename(path, destiny_os=os.name, fs_encoding=compat.FS_ENCODING):
@@ -926,6 +1139,11 @@ def secure_filename(path, destiny_os=os.name, fs_encoding=compat.FS_ENCODING):
     if isinstance(path, bytes):
         path = path.decode('latin-1', errors=underscore_replace)
 
+    # the round-trip below only replaces characters the filesystem
+    # encoding cannot hold, so it is a no-op for ASCII filenames
+    if compat.isascii(path):
+        return path
+
     # Decode and recover from filesystem encoding in order to strip unwanted
     # characters out
     kwargs = {
@@ -950,12 +1168,10 @@ def alternative_filename(filename, attempt=None):
     :return: new filename
     :rtype: str or unicode
     '''
-    filename_parts = filename.rsplit(u'.', 2)
-    name = filename_parts[0]
-    ext = ''.join(u'.%s' % ext for ext in filename_parts[1:])
+    name = filename.rsplit(u'.', 2)[0]
+    ext = filename[len(name):]
     if attempt is None:
-        choose = random.choice
-        extra = u' %s' % ''.join(choose(fs_safe_characters) for i in range(8))
+        extra = u' %s' % ''.join(choices(fs_safe_characters, k=8))
     else:
         extra = u' (%d)' % attempt
     return u'%s%s%s' % (name, extra, ext)
@@ -8,11 +8,10 @@ import warnings
 import collections
 
 from flask import current_app
-from werkzeug.utils import cached_property
 
 from . import mimetype
 from . import compat
-from .compat import deprecated, usedoc
+from .compat import cached_property, deprecated, usedoc
 
 
 def defaultsnamedtuple(name, fields, defaults=None):
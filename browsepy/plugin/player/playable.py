@@ -4,10 +4,8 @@ import codecs
 import os.path
 import warnings
 
-from werkzeug.utils import cached_property
-
-from browsepy.compat import range, PY_LEGACY  # noqa
-from browsepy.file import Node, File, Directory, \
+from browsepy.compat import range, cached_property, PY_LEGACY  # noqa
+from browsepy.file import Node, File, Directory, scandir, \
                           underscore_replace, check_under_base
 
 
@@ -81,10 +79,10 @@ class PlayableBase(File):
 
     @classmethod
     def detect(cls, node, os_sep=os.sep):
-        basename = node.path.rsplit(os_sep)[-1]
-        if '.' in basename:
-            ext = basename.rsplit('.')[-1]
-            return cls.extensions.get(ext, None)
+        basename = node.path.rpartition(os_sep)[2]
+        ext = basename.rpartition('.')
+        if ext[1]:
+            return cls.extensions.get(ext[2], None)
         return None
 
 
@@ -228,8 +226,10 @@ class PlayableDirectory(Directory):
     @classmethod
     def detect(cls, node):
         if node.is_directory:
-            for file in node._listdir():
-                if PlayableFile.detect(file):
+            extensions = cls.file_class.extensions
+            for entry in scandir(node.path, node.app):
+                ext = entry.name.rpartition('.')
+                if ext[1] and ext[2] in extensions:
                     return cls.mimetype
         return None
 
@@ -241,8 +241,8 @@ class PlayableDirectory(Directory):
 
 
 def detect_playable_mimetype(path, os_sep=os.sep):
-    basename = path.rsplit(os_sep)[-1]
-    if '.' in basename:
-        ext = basename.rsplit('.')[-1]
-        return PlayableBase.extensions.get(ext, None)
+    basename = path.rpartition(os_sep)[2]
+    ext = basename.rpartition('.')
+    if ext[1]:
+        return PlayableBase.extensions.get(ext[2], None)
     return None
@@ -93,6 +93,18 @@ class TestCompat(unittest.TestCase):
             path
             )
 
+    def test_isascii(self):
+        self.assertTrue(self.module.isascii(u'abcdefgh'))
+        self.assertTrue(self.module.isascii(u''))
+        self.assertFalse(self.module.isascii(u'/a/\xf1'))
+
+        class legacy_str(str):
+            # raises AttributeError on access, like str before python 3.7
+            isascii = property()
+
+        self.assertTrue(self.module.isascii(legacy_str(u'abcdefgh')))
+        self.assertFalse(self.module.isascii(legacy_str(u'/a/\xf1')))
+
     def test_pathconf(self):
         kwargs = {
             'os_name': 'posix',
@@ -54,6 +54,24 @@ class TestFile(unittest.TestCase):
         self.assertEqual(content[0].size, '1 B')
         self.assertEqual(content[0].path, tmp_txt)
 
+    @unittest.skipUnless(hasattr(os, 'symlink'), 'requires os.symlink')
+    def test_listdir_broken_symlink(self):
+        directory = self.module.Directory(path=self.workbench)
+
+        self.textfile('real.txt', 'a')
+        os.symlink(
+            os.path.join(self.workbench, 'missing'),
+            os.path.join(self.workbench, 'broken')
+            )
+
+        content = directory.listdir(sortkey=lambda node: node.name)
+        self.assertEqual(
+            [node.name for node in content],
+            ['broken', 'real.txt']
+            )
+        self.assertFalse(content[0].is_directory)
+        self.assertFalse(directory.is_empty)
+
     def test_check_forbidden_filename(self):
         cff = self.module.check_forbidden_filename
         self.assertFalse(cff('myfilename', destiny_os='posix'))